@@ -0,0 +1,22 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Native DFA driver for RegexFSM.check_string.
+Build in place with `cythonize -i _regex_core.pyx`; regex.py falls back
+to the pure Python loop when this module is not built.
+"""
+
+
+cpdef bint match(const int[::1] table, const unsigned char[::1] classes, const unsigned char[::1] accept,
+                 const unsigned char[::1] s, int state=0, Py_ssize_t start=0):
+    """
+    Run the DFA over the bytes of s from index start, starting from the given state.
+    table is the flattened num_states x num_classes transition table (negative for the dead state),
+    classes maps every byte to its class and accept holds one flag per state
+    """
+    cdef Py_ssize_t width = table.shape[0] // accept.shape[0]
+    cdef Py_ssize_t i
+    for i in range(start, s.shape[0]):
+        state = table[state * width + classes[s[i]]]
+        if state < 0:
+            return False
+    return accept[state] != 0
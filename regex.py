@@ -1,8 +1,127 @@
 from __future__ import annotations
+import functools
+import sys
+import threading
+import warnings
 from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from math import inf
+
+try:
+    from _regex_core import match as _native_match
+except ImportError:
+    _native_match = None
+
+_jit_dfa_run = None
+
+
+def _dfa_run(table, classes, accept, buf, state, start):
+    """DFA stepping loop over a bytes buffer from index start, compiled with numba for RegexFSM(..., jit=True)"""
+    for i in range(start, len(buf)):
+        state = table[state, classes[buf[i]]]
+        if state < 0:
+            return False
+    return accept[state]
+
+
+def _load_jit_dfa_run():
+    """Import numba and compile _dfa_run on first use"""
+    global _jit_dfa_run
+    if _jit_dfa_run is None:
+        from numba import njit
+        _jit_dfa_run = njit(cache=True)(_dfa_run)
+    return _jit_dfa_run
+
+DEAD = -1
+UNKNOWN = -2
+MAX_DFA_STATES = 1024
+DOT = -1
+BYTE_MASK = (1 << 256) - 1
+_BITS = bytes.maketrans(b'01', b'\x00\x01')
+KIND_CHAR, KIND_CLASS, KIND_STAR, KIND_PLUS, KIND_STAR_CLASS, KIND_PLUS_CLASS = range(6)
+TOKEN_KINDS = {
+    'char': KIND_CHAR,
+    'class': KIND_CLASS,
+    'star': KIND_STAR,
+    'plus': KIND_PLUS,
+    'star_class': KIND_STAR_CLASS,
+    'plus_class': KIND_PLUS_CLASS,
+}
+
+
+def _byte_table(mask):
+    """256-entry acceptance table of a bitmask: table[byte] is 1 when bit byte is set"""
+    return format(mask & BYTE_MASK, '0256b')[::-1].encode('ascii').translate(_BITS)
+
+
+def _caller_stacklevel():
+    """stacklevel for warnings.warn that points at the first caller outside this module"""
+    frame = sys._getframe(1)
+    level = 1
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+        level += 1
+    return level
+
+
+def _to_buffer(string):
+    """Encode a string as latin-1 bytes, or as an array of code points if it does not fit in 8 bits"""
+    try:
+        return string.encode('latin-1')
+    except UnicodeEncodeError:
+        return array('l', map(ord, string))
+
+
+class _MaskTable:
+    """
+    Acceptance table over all code points backed by a token bitmask,
+    used in place of the 256-entry tables for code point buffers
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, mask: int) -> None:
+        self.mask = mask
+
+    def __getitem__(self, code: int) -> int:
+        return (self.mask >> code) & 1
+
+
+def _parse_class(class_pattern):
+    """Split a character class pattern like '^a-z0' into (negated, [(start, end), ...])"""
+    negated = class_pattern.startswith('^')
+    content = class_pattern[1:] if negated else class_pattern
+    ranges = []
+    i = 0
+    while i < len(content):
+        if i + 2 < len(content) and content[i+1] == '-':
+            ranges.append((content[i], content[i+2]))
+            i += 3
+        else:
+            ranges.append((content[i], content[i]))
+            i += 1
+    return negated, ranges
+
+
+def _ranges_mask(ranges):
+    """Membership bitmask of a list of (start, end) character ranges"""
+    mask = 0
+    for start, end in ranges:
+        if ord(start) <= ord(end):
+            mask |= ((1 << (ord(end) - ord(start) + 1)) - 1) << ord(start)
+    return mask
+
+
+def _compile_class(class_pattern):
+    """Compile a character class pattern into a bitmask, complemented for negated classes"""
+    negated, ranges = _parse_class(class_pattern)
+    mask = _ranges_mask(ranges)
+    return ~mask if negated else mask
 
 
 class State(ABC):
+    __slots__ = ('next_states', 'is_terminal')
+
     def __init__(self) -> None:
         self.next_states = []
         self.is_terminal = False
@@ -14,14 +133,28 @@ class State(ABC):
         """
         pass
 
-    def check_next(self, next_char: str) -> State | Exception:
+    def check_next(self, next_char: str) -> State | None:
+        """
+        function returns the next state that handles the character, or None if the string is rejected
+        """
         for state in self.next_states:
             if state.check_self(next_char):
                 return state
-        raise Exception("rejected string")
+        return None
+
+    def check_next_strict(self, next_char: str) -> State:
+        """
+        same as check_next, but raises an exception for a rejected string
+        """
+        state = self.check_next(next_char)
+        if state is None:
+            raise Exception("rejected string")
+        return state
 
 
 class StartState(State):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -30,6 +163,8 @@ class StartState(State):
 
 
 class TerminationState(State):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.is_terminal = True
@@ -37,14 +172,16 @@ class TerminationState(State):
     def check_self(self, char):
         return False
         
-    def check_next(self, next_char: str) -> State | Exception:
-        raise Exception("rejected string")
+    def check_next(self, next_char: str) -> State | None:
+        return None
 
 
 class DotState(State):
     """
     state for . character (any character accepted)
     """
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -56,6 +193,8 @@ class AsciiState(State):
     """
     state for alphabet letters or numbers
     """
+    __slots__ = ('symbol',)
+
     def __init__(self, symbol: str) -> None:
         super().__init__()
         self.symbol = symbol
@@ -68,28 +207,31 @@ class CharacterClassState(State):
     """
     State for character classes like [a-z], [0-9], etc.
     """
+    __slots__ = ('pattern', 'negated', 'ranges', 'mask', 'starts', 'ends')
+
     def __init__(self, pattern: str) -> None:
         super().__init__()
         self.pattern = pattern
-        self.negated = pattern.startswith('^')
-        content = pattern[1:] if self.negated else pattern
-        self.ranges = []
-        i = 0
-        while i < len(content):
-            if i + 2 < len(content) and content[i+1] == '-':
-                start, end = content[i], content[i+2]
-                self.ranges.append((start, end))
-                i += 3
+        self.negated, ranges = _parse_class(pattern)
+        merged = []
+        for start, end in sorted(r for r in ranges if r[0] <= r[1]):
+            if merged and ord(start) <= ord(merged[-1][1]) + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
             else:
-                self.ranges.append((content[i], content[i]))
-                i += 1
+                merged.append((start, end))
+        self.ranges = tuple(merged)
+        self.starts = array('i', [ord(start) for start, _ in merged])
+        self.ends = array('i', [ord(end) for _, end in merged])
+        # the bitmask is only used for 8-bit classes, wider ones are binary searched
+        self.mask = _ranges_mask(merged) if not merged or ord(merged[-1][1]) < 256 else None
 
     def check_self(self, char: str) -> bool:
-        in_range = False
-        for start, end in self.ranges:
-            if ord(start) <= ord(char) <= ord(end):
-                in_range = True
-                break
+        code = ord(char)
+        if self.mask is not None:
+            in_range = (self.mask >> code) & 1 == 1
+        else:
+            idx = bisect_right(self.starts, code) - 1
+            in_range = idx >= 0 and code <= self.ends[idx]
         return not in_range if self.negated else in_range
 
 
@@ -97,6 +239,8 @@ class StarState(State):
     """
     State for * repetition (0 or more)
     """
+    __slots__ = ('checking_state',)
+
     def __init__(self, checking_state: State):
         super().__init__()
         self.checking_state = checking_state
@@ -109,6 +253,8 @@ class PlusState(State):
     """
     State for + repetition (1 or more)
     """
+    __slots__ = ('checking_state',)
+
     def __init__(self, checking_state: State):
         super().__init__()
         self.checking_state = checking_state
@@ -117,14 +263,51 @@ class PlusState(State):
         return self.checking_state.check_self(char)
 
 
+class PatternAnalyzer:
+    """
+    Classifies a parsed pattern to pick the matching engine:
+    SIMPLE patterns have only single-character tokens, MEDIUM ones also have * or + quantifiers,
+    COMPLEX ones contain tokens the DFA cannot represent and always use the backtracker
+    """
+    SIMPLE = 'SIMPLE'
+    MEDIUM = 'MEDIUM'
+    COMPLEX = 'COMPLEX'
+
+    def __init__(self, parsed_pattern: list) -> None:
+        self.parsed_pattern = parsed_pattern
+        self.complexity = self._classify()
+
+    def _classify(self) -> str:
+        token_types = {token_type for token_type, _ in self.parsed_pattern}
+        if not token_types <= set(TOKEN_KINDS):
+            return self.COMPLEX
+        if token_types <= {'char', 'class'}:
+            return self.SIMPLE
+        return self.MEDIUM
+
+
 class RegexFSM:
-    def __init__(self, regex_expr: str) -> None:
+    def __init__(self, regex_expr: str, jit: bool = False) -> None:
         if not regex_expr:
             raise ValueError("Empty regex pattern")
         self.regex = regex_expr
+        self.jit = jit
         if regex_expr.startswith('*') or regex_expr.startswith('+'):
             raise ValueError(f"Invalid regex pattern: {regex_expr}")
+        if jit:
+            # fail fast on a missing numba; only the table conversion waits for the DFA
+            self._jit_run = _load_jit_dfa_run()
         self._parse_pattern()
+        self._analyze_ambiguity()
+        self.complexity = PatternAnalyzer(self.parsed_pattern).complexity
+        # the DFA is built lazily: a pattern matched only once never pays for it
+        self.dfa_table = None
+        self._dfa_lock = threading.Lock()
+        self._dfa_impl = None
+        if self.has_ida and self.complexity != PatternAnalyzer.COMPLEX:
+            self._impl = self._build_dfa_check
+        else:
+            self._impl = self._backtrack_once
     
     def _parse_pattern(self):
         """Parse the regex pattern into a structured format"""
@@ -139,163 +322,443 @@ class RegexFSM:
                 
                 if j >= len(self.regex):
                     raise ValueError("Unmatched bracket in regex pattern")
-                class_content = self.regex[i+1:j]
+                class_mask = _compile_class(self.regex[i+1:j])
                 
                 if j + 1 < len(self.regex) and self.regex[j+1] == '*':
-                    self.parsed_pattern.append(('star_class', class_content))
+                    self.parsed_pattern.append(('star_class', class_mask))
                     i = j + 2
                 elif j + 1 < len(self.regex) and self.regex[j+1] == '+':
-                    self.parsed_pattern.append(('plus_class', class_content))
+                    self.parsed_pattern.append(('plus_class', class_mask))
                     i = j + 2
                 else:
-                    self.parsed_pattern.append(('class', class_content))
+                    self.parsed_pattern.append(('class', class_mask))
                     i = j + 1
             elif i + 1 < len(self.regex) and self.regex[i+1] == '*':
                 if self.regex[i] == '.':
-                    self.parsed_pattern.append(('star', '.'))
+                    self.parsed_pattern.append(('star', DOT))
                 else:
-                    self.parsed_pattern.append(('star', self.regex[i]))
+                    self.parsed_pattern.append(('star', ord(self.regex[i])))
                 i += 2
             elif i + 1 < len(self.regex) and self.regex[i+1] == '+':
                 if self.regex[i] == '.':
-                    self.parsed_pattern.append(('plus', '.'))
+                    self.parsed_pattern.append(('plus', DOT))
                 else:
-                    self.parsed_pattern.append(('plus', self.regex[i]))
+                    self.parsed_pattern.append(('plus', ord(self.regex[i])))
                 i += 2
             elif self.regex[i] == '*' or self.regex[i] == '+':
                 i += 1
+            elif self.regex[i] == '.':
+                self.parsed_pattern.append(('char', DOT))
+                i += 1
             else:
-                self.parsed_pattern.append(('char', self.regex[i]))
+                self.parsed_pattern.append(('char', ord(self.regex[i])))
                 i += 1
-    
-    def check_string(self, string: str) -> bool:
-        """Check if the input string matches the regex pattern"""
-        return self._match(0, 0, string)
-    
-    def _match(self, pattern_pos, string_pos, string):
+
+        # only quantifier positions can be reached more than once for the same
+        # string position, so only they are memoized
+        self._memo_rows = [-1] * (len(self.parsed_pattern) + 1)
+        self._memo_count = 0
+        for pos, (token_type, _) in enumerate(self.parsed_pattern):
+            if token_type in ('star', 'plus', 'star_class', 'plus_class'):
+                self._memo_rows[pos] = self._memo_count
+                self._memo_count += 1
+
+        self.min_len = sum(1 for token_type, _ in self.parsed_pattern
+                           if token_type in ('char', 'class', 'plus', 'plus_class'))
+        self.max_len = (inf if any(token_type in ('star', 'plus', 'star_class', 'plus_class')
+                                   for token_type, _ in self.parsed_pattern)
+                        else len(self.parsed_pattern))
+
+        # literal characters at both ends of the pattern let check_string
+        # reject most strings with startswith/endswith before running a matcher
+        prefix_len = 0
+        while (prefix_len < len(self.parsed_pattern) and self.parsed_pattern[prefix_len][0] == 'char'
+               and self.parsed_pattern[prefix_len][1] != DOT):
+            prefix_len += 1
+        suffix_start = len(self.parsed_pattern)
+        while (suffix_start > prefix_len and self.parsed_pattern[suffix_start - 1][0] == 'char'
+               and self.parsed_pattern[suffix_start - 1][1] != DOT):
+            suffix_start -= 1
+        self._literal_prefix = ''.join(chr(value) for _, value in self.parsed_pattern[:prefix_len])
+        self._literal_suffix = ''.join(chr(value) for _, value in self.parsed_pattern[suffix_start:])
+        try:
+            self._affix_bytes = (self._literal_prefix.encode('latin-1'),
+                                 self._literal_suffix.encode('latin-1'))
+        except UnicodeEncodeError:
+            # no bytes input can contain these literals
+            self._affix_bytes = None
+
+        # first mandatory 8-bit literal between the prefix and the suffix, with the number
+        # of characters that must precede it; bytes.find on it rejects strings without it
+        self._required_literal = None
+        offset = prefix_len
+        for token_type, token_value in self.parsed_pattern[prefix_len:suffix_start]:
+            if token_type in ('char', 'plus') and 0 <= token_value < 256:
+                self._required_literal = (token_value, offset)
+                break
+            if token_type in ('char', 'class', 'plus', 'plus_class'):
+                offset += 1
+
+        # membership bitmask per token; the acceptance tables built from it are lazy
+        self._token_masks = []
+        for token_type, token_value in self.parsed_pattern:
+            if token_type in ('class', 'star_class', 'plus_class'):
+                self._token_masks.append(token_value)
+            elif token_value == DOT:
+                self._token_masks.append(-1)
+            else:
+                self._token_masks.append(1 << token_value)
+
+        # compact form of the tokens for the matcher loop: integer kinds
+        # and literal codes (DOT for '.', 0 for classes)
+        self.kinds = array('b', [TOKEN_KINDS[token_type] for token_type, _ in self.parsed_pattern])
+        self.char_vals = array('i', [token_value if token_type in ('char', 'star', 'plus') else 0
+                                     for token_type, token_value in self.parsed_pattern])
+
+    def _analyze_ambiguity(self):
         """
-        Recursive backtracking algorithm to match the regex pattern against the string
+        Detect adjacent quantifiers over overlapping alphabets (like a*a* or a*[a-z]+),
+        which give the pattern an infinite degree of ambiguity.
+        Such patterns are matched with the DFA from the first string on,
+        keeping the backtracker for code point buffers only
         """
-        if pattern_pos >= len(self.parsed_pattern):
-            return string_pos >= len(string)
-
-        token_type, token_value = self.parsed_pattern[pattern_pos]
-        if token_type == 'char':
-            if token_value == '.':
-                if string_pos < len(string):
-                    return self._match(pattern_pos + 1, string_pos + 1, string)
-            else:
-                if string_pos < len(string) and string[string_pos] == token_value:
-                    return self._match(pattern_pos + 1, string_pos + 1, string)
-
-        elif token_type == 'class':
-            if string_pos < len(string) and self._match_character_class(token_value, string[string_pos]):
-                return self._match(pattern_pos + 1, string_pos + 1, string)
-
-        elif token_type == 'star':
-            if self._match(pattern_pos + 1, string_pos, string):
-                return True
-
-            i = string_pos
-            while i < len(string):
-                matched = False
-                if token_value == '.':
-                    matched = True
-                else:
-                    matched = string[i] == token_value
-                
-                if not matched:
-                    break
+        self.has_ida = False
+        quantifiers = ('star', 'plus', 'star_class', 'plus_class')
+        for pos in range(len(self.parsed_pattern) - 1):
+            if (self.parsed_pattern[pos][0] in quantifiers and self.parsed_pattern[pos + 1][0] in quantifiers
+                    and self._token_masks[pos] & self._token_masks[pos + 1]):
+                self.has_ida = True
+                break
+        if not self.has_ida:
+            return
 
-                if self._match(pattern_pos + 1, i + 1, string):
-                    return True
-                i += 1
+        warnings.warn(f"potential catastrophic backtracking in regex pattern: {self.regex}; "
+                      "matching it with the DFA",
+                      RuntimeWarning, stacklevel=_caller_stacklevel())
 
-        elif token_type == 'plus':
+    @functools.cached_property
+    def accept_tables(self):
+        """256-entry acceptance table per token: accept_tables[pos][byte] is 1 when the token accepts that byte"""
+        return [_byte_table(mask) for mask in self._token_masks]
 
-            if string_pos >= len(string):
-                return False
+    @functools.cached_property
+    def _wide_tables(self):
+        """Acceptance tables over all code points, for code point buffers"""
+        return [_MaskTable(mask) for mask in self._token_masks]
 
-            matched = False
-            if token_value == '.':
-                matched = True
+    def _build_nfa(self):
+        """
+        Build a Thompson NFA from the parsed pattern.
+        Returns (edges, epsilon, final) where edges[s] is a list of (acceptance table, target)
+        and epsilon[s] is a list of epsilon targets; the start state is 0
+        """
+        edges = [[]]
+        epsilon = [[]]
+        current = 0
+        for (token_type, _), accepted in zip(self.parsed_pattern, self.accept_tables):
+            edges.append([])
+            epsilon.append([])
+            following = len(edges) - 1
+            if token_type in ('char', 'class'):
+                edges[current].append((accepted, following))
+            elif token_type in ('star', 'star_class'):
+                edges[current].append((accepted, current))
+                epsilon[current].append(following)
             else:
-                matched = string[string_pos] == token_value
-            
-            if not matched:
-                return False
-            i = string_pos + 1
-            while i <= len(string):
-
-                if self._match(pattern_pos + 1, i, string):
-                    return True
+                edges.append([])
+                epsilon.append([])
+                loop = len(edges) - 1
+                edges[current].append((accepted, loop))
+                edges[loop].append((accepted, loop))
+                epsilon[loop].append(following)
+            current = following
+        return edges, epsilon, current
+
+    @functools.cached_property
+    def byte_classes(self):
+        """
+        Byte class of every byte: bytes accepted by exactly the same tokens are
+        interchangeable, so DFA rows hold one transition per class
+        """
+        signatures = {}
+        return bytes(signatures.setdefault(signature, len(signatures)) for signature in zip(*self.accept_tables))
 
-                if i >= len(string):
-                    break
+    def _subset_steps(self):
+        """
+        Prepare subset construction over the Thompson NFA.
+        Returns (start, step, final): the start subset, step(subset, cls) giving the
+        subset reached on byte class cls, and the final NFA state
+        """
+        edges, epsilon, final = self._build_nfa()
+        byte_classes = self.byte_classes
+        representatives = [0] * (max(byte_classes) + 1)
+        for b in range(255, -1, -1):
+            representatives[byte_classes[b]] = b
+
+        def closure(states):
+            stack = list(states)
+            result = set(states)
+            while stack:
+                for target in epsilon[stack.pop()]:
+                    if target not in result:
+                        result.add(target)
+                        stack.append(target)
+            return frozenset(result)
+
+        def step(subset, cls):
+            b = representatives[cls]
+            return closure([target for state in subset for accepted, target in edges[state] if accepted[b]])
+
+        return closure([0]), step, final
+
+    def _build_dfa(self):
+        """
+        Subset-construct a DFA from the Thompson NFA.
+        Fills self.dfa_table (num_states x num_byte_classes, DEAD for rejection) and self.accept.
+        Everything is built in locals and only published once complete,
+        so concurrent readers never see a half-built table.
+        Returns False, leaving self.dfa_table as None, when the DFA would need
+        more than MAX_DFA_STATES states (like .*a.........)
+        """
+        start, step, final = self._subset_steps()
+        byte_classes = self.byte_classes
+        num_classes = max(byte_classes) + 1
+
+        index = {start: 0}
+        queue = [start]
+        dfa_table = []
+        accept = set()
+        while len(dfa_table) < len(queue):
+            subset = queue[len(dfa_table)]
+            if final in subset:
+                accept.add(index[subset])
+            row = []
+            for cls in range(num_classes):
+                targets = step(subset, cls)
+                if not targets:
+                    row.append(DEAD)
+                    continue
+                if targets not in index:
+                    if len(queue) == MAX_DFA_STATES:
+                        return False
+                    index[targets] = len(queue)
+                    queue.append(targets)
+                row.append(index[targets])
+            dfa_table.append(row)
+
+        # bytes buffers only reach the DFA when they start with the prefix,
+        # so the prefix is always 8-bit here
+        prefix_state = 0
+        for byte in self._affix_bytes[0] if self._affix_bytes else b'':
+            prefix_state = dfa_table[prefix_state][byte_classes[byte]]
+
+        if self.jit:
+            import numpy as np
+            self._jit_table = np.array(dfa_table, dtype=np.int32)
+            self._jit_accept = np.array([state in accept for state in range(len(dfa_table))], dtype=np.bool_)
+        elif _native_match is not None:
+            self._flat_table = array('i', [target for row in dfa_table for target in row])
+            self._accept_flags = bytes(state in accept for state in range(len(dfa_table)))
+        self._prefix_state = prefix_state
+        self.accept = accept
+        self.dfa_table = dfa_table
+        return True
 
-                matched = False
-                if token_value == '.':
-                    matched = True
+    def _build_lazy_dfa(self):
+        """
+        Prepare the on-demand DFA used when the full one would exceed MAX_DFA_STATES.
+        Its states and transitions are built while matching and cached, at most
+        MAX_DFA_STATES of them at a time (see _lazy_dfa_check)
+        """
+        start, step, final = self._subset_steps()
+        for byte in self._affix_bytes[0] if self._affix_bytes else b'':
+            start = step(start, self.byte_classes[byte])
+        self._lazy_step = step
+        self._lazy_final = final
+        self._lazy_prefix_subset = start
+        self._lazy_index = {}
+        self._lazy_subsets = []
+        self._lazy_rows = []
+
+    def _lazy_state(self, subset):
+        """Cached state number of a subset, flushing the cache when it is full"""
+        state = self._lazy_index.get(subset)
+        if state is None:
+            if len(self._lazy_subsets) == MAX_DFA_STATES:
+                self._lazy_index.clear()
+                self._lazy_subsets.clear()
+                self._lazy_rows.clear()
+            state = len(self._lazy_subsets)
+            self._lazy_index[subset] = state
+            self._lazy_subsets.append(subset)
+            self._lazy_rows.append([UNKNOWN] * (max(self.byte_classes) + 1))
+        return state
+
+    def check_string(self, string: str | bytes | bytearray | memoryview) -> bool:
+        """
+        Check if the input string (or latin-1 bytes, bytearray or uint8 memoryview)
+        matches the regex pattern
+        """
+        if not isinstance(string, (str, bytes)):
+            # other buffers are copied to bytes once, the matchers rely on bytes methods
+            string = bytes(string)
+        if not self.min_len <= len(string) <= self.max_len:
+            return False
+        if isinstance(string, str):
+            if not string.startswith(self._literal_prefix) or not string.endswith(self._literal_suffix):
+                return False
+            return self._impl(_to_buffer(string))
+        if (self._affix_bytes is None or not string.startswith(self._affix_bytes[0])
+                or not string.endswith(self._affix_bytes[1])):
+            return False
+        return self._impl(string)
+
+    def _backtrack_once(self, buf):
+        """Match the first string with _match and build a faster engine only if the pattern is reused"""
+        if self.complexity == PatternAnalyzer.COMPLEX:
+            self._impl = self._backtrack_check
+        else:
+            self._impl = self._build_dfa_check
+        if isinstance(buf, bytes) and self._lacks_required_literal(buf):
+            return False
+        return self._match(buf, len(self._literal_prefix))
+
+    def _build_dfa_check(self, buf):
+        """Build the DFA on the second match and use it from then on, or an on-demand one if it is too big"""
+        with self._dfa_lock:
+            if self._dfa_impl is None:
+                if self._build_dfa():
+                    self._dfa_impl = self._dfa_check
                 else:
-                    matched = string[i] == token_value
-                if not matched:
-                    break
-                i += 1
-        elif token_type == 'star_class':
+                    self._build_lazy_dfa()
+                    self._dfa_impl = self._lazy_dfa_check
+        # the engine is switched only after the DFA is fully published
+        self._impl = self._dfa_impl
+        return self._dfa_impl(buf)
+
+    def _backtrack_check(self, buf):
+        """Run _match, rejecting bytes buffers without the required literal first"""
+        if isinstance(buf, bytes) and self._lacks_required_literal(buf):
+            return False
+        return self._match(buf, len(self._literal_prefix))
+
+    def _lacks_required_literal(self, buf):
+        """Check with bytes.find that a bytes buffer misses the first mandatory literal"""
+        if self._required_literal is None:
+            return False
+        literal, offset = self._required_literal
+        return buf.find(literal, offset) == -1
+
+    def _dfa_check(self, buf):
+        """Run the DFA over the buffer after the literal prefix"""
+        if not isinstance(buf, bytes):
+            return self._match(buf, len(self._literal_prefix))
+        state = self._prefix_state
+        start = len(self._affix_bytes[0])
+        classes = self.byte_classes
+        if self.jit:
+            return bool(self._jit_run(self._jit_table, classes, self._jit_accept, buf, state, start))
+        if _native_match is not None:
+            return _native_match(self._flat_table, classes, self._accept_flags, buf, state, start)
+        table = self.dfa_table
+        # one C-level translate to byte classes keeps the per-byte loop at a single lookup
+        data = buf.translate(classes)
+        for cls in memoryview(data)[start:] if start else data:
+            state = table[state][cls]
+            if state == DEAD:
+                return False
+        return state in self.accept
 
-            if self._match(pattern_pos + 1, string_pos, string):
-                return True
+    def _lazy_dfa_check(self, buf):
+        """
+        Run the on-demand DFA over the buffer after the literal prefix.
+        A missing transition costs one subset step; when the cache is full it is flushed
+        and refilled from the current subset, so memory stays bounded and every byte
+        is still processed in O(|pattern|) time.
+        The cache is shared, so matches run under the DFA lock
+        """
+        if not isinstance(buf, bytes):
+            return self._match(buf, len(self._literal_prefix))
+        start = len(self._affix_bytes[0])
+        data = buf.translate(self.byte_classes)
+        subsets = self._lazy_subsets
+        rows = self._lazy_rows
+        with self._dfa_lock:
+            state = self._lazy_state(self._lazy_prefix_subset)
+            for cls in memoryview(data)[start:] if start else data:
+                target = rows[state][cls]
+                if target == UNKNOWN:
+                    subset = self._lazy_step(subsets[state], cls)
+                    # if _lazy_state flushes the cache, row is a dropped list and the store is harmless
+                    row = rows[state]
+                    row[cls] = target = self._lazy_state(subset) if subset else DEAD
+                if target == DEAD:
+                    return False
+                state = target
+            return self._lazy_final in subsets[state]
+    
+    def _match(self, buf, start=0):
+        """
+        Backtracking algorithm to match the regex pattern against a buffer:
+        latin-1 bytes, or an array of code points for wider strings.
+        Pending (pattern_pos, string_pos) configurations are kept on an explicit stack
+        instead of the call stack. Used for the first match of a pattern
+        and for strings with characters outside the 8-bit alphabet of the DFA.
+        A quantifier step either leaves the quantifier or consumes one more character,
+        and quantifier configurations are recorded in visited, so every pair is
+        expanded at most once with O(1) successors: O(|pattern| * |string|) in total.
+        check_string passes the length of the literal prefix as start, since it has
+        already checked it; prefix tokens are single characters, so the pattern and
+        string positions both start there
+        """
+        kinds = self.kinds
+        tables = self.accept_tables if isinstance(buf, bytes) else self._wide_tables
+        pattern_len = len(kinds)
+        string_len = len(buf)
+        memo_rows = self._memo_rows
+        visited = bytearray(self._memo_count * (string_len + 1))
+
+        stack = [(start, start)]
+        while stack:
+            pattern_pos, string_pos = stack.pop()
+            if pattern_pos == pattern_len:
+                if string_pos == string_len:
+                    return True
+                continue
+
+            kind = kinds[pattern_pos]
+            accepted = string_pos < string_len and tables[pattern_pos][buf[string_pos]]
+            if kind == KIND_CHAR or kind == KIND_CLASS:
+                if accepted:
+                    stack.append((pattern_pos + 1, string_pos + 1))
+                continue
+
+            key = memo_rows[pattern_pos] * (string_len + 1) + string_pos
+            if visited[key]:
+                continue
+            visited[key] = 1
+            # x* is either empty or x followed by x*, and x+ is x followed by
+            # either nothing or x+; the longer run is pushed last so it is tried first
+            if kind == KIND_STAR or kind == KIND_STAR_CLASS:
+                stack.append((pattern_pos + 1, string_pos))
+            elif accepted:
+                stack.append((pattern_pos + 1, string_pos + 1))
+            if accepted:
+                stack.append((pattern_pos, string_pos + 1))
 
-            i = string_pos
-            while i < len(string):
-                if not self._match_character_class(token_value, string[i]):
-                    break
+        return False
 
-                if self._match(pattern_pos + 1, i + 1, string):
-                    return True
-                i += 1
 
-        elif token_type == 'plus_class':
-            if string_pos >= len(string) or not self._match_character_class(token_value, string[string_pos]):
-                return False
+@functools.lru_cache(maxsize=512)
+def compile(pattern: str, jit: bool = False) -> RegexFSM:
+    """Return a compiled RegexFSM for the pattern, reusing it for repeated patterns"""
+    return RegexFSM(pattern, jit)
 
-            i = string_pos + 1
-            while i <= len(string):
-                if self._match(pattern_pos + 1, i, string):
-                    return True
-                if i >= len(string) or not self._match_character_class(token_value, string[i]):
-                    break
-                
-                i += 1
-        
-        return False
-    
-    def _match_character_class(self, class_pattern, char):
-        """Check if a character matches a character class pattern"""
-        negated = class_pattern.startswith('^')
-        content = class_pattern[1:] if negated else class_pattern
-        
-        in_range = False
-        i = 0
-        while i < len(content):
-            if i + 2 < len(content) and content[i+1] == '-':
-                start, end = content[i], content[i+2]
-                if ord(start) <= ord(char) <= ord(end):
-                    in_range = True
-                    break
-                i += 3
-            else:
-                if char == content[i]:
-                    in_range = True
-                    break
-                i += 1
-        
-        return not in_range if negated else in_range
 
 if __name__ == "__main__":
     regex_pattern = "a*4.+hi"
 
-    regex_compiled = RegexFSM(regex_pattern)
+    regex_compiled = compile(regex_pattern)
 
     print(regex_compiled.check_string("aaaaaa4uhi"))  # True
     print(regex_compiled.check_string("4uhi"))  # True
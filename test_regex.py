@@ -0,0 +1,203 @@
+import random
+import re
+import sys
+import threading
+import time
+import unittest
+import warnings
+from unittest import mock
+
+import regex
+from regex import RegexFSM, _to_buffer
+
+PATTERNS = [
+    'abc', 'a.c', 'a*', 'a+b', '.*', 'a*4.+hi', '[a-c]+x', '[^ab]*c',
+    'x[0-9]+y*', 'ab*c.', 'ї+[а-я]*', '[à-ÿ]+é', '.+ї.',
+]
+STRINGS = [
+    '', 'a', 'abc', 'aac', 'aaaa', 'aab', 'b', 'aaa4zhi', '4hi', 'aa4hi',
+    'bbx', 'abcx', 'ddc', 'abc', 'x12yy', 'x1y', 'xy', 'abbbcz', 'acü',
+    'ї', 'їїабв', 'їz', 'àé', 'éé', 'aїb', 'ïїï',
+]
+
+
+def expected(pattern, string):
+    return re.fullmatch(pattern, string, re.DOTALL) is not None
+
+
+def latin1(string):
+    try:
+        return string.encode('latin-1')
+    except UnicodeEncodeError:
+        return None
+
+
+class EngineAgreementTest(unittest.TestCase):
+    def check_engine(self, run):
+        for pattern in PATTERNS:
+            for string in STRINGS:
+                with self.subTest(pattern=pattern, string=string):
+                    self.assertEqual(run(pattern, string), expected(pattern, string))
+
+    def test_first_call(self):
+        self.check_engine(lambda pattern, string: RegexFSM(pattern).check_string(string))
+
+    def test_later_calls(self):
+        fsms = {pattern: RegexFSM(pattern) for pattern in PATTERNS}
+        for _ in range(3):
+            self.check_engine(lambda pattern, string: fsms[pattern].check_string(string))
+
+    def test_bytes_input(self):
+        fsms = {pattern: RegexFSM(pattern) for pattern in PATTERNS}
+        for _ in range(3):
+            for pattern in PATTERNS:
+                for string in STRINGS:
+                    data = latin1(string)
+                    if data is None:
+                        continue
+                    with self.subTest(pattern=pattern, string=string):
+                        self.assertEqual(fsms[pattern].check_string(data), expected(pattern, string))
+
+    def test_buffer_input(self):
+        fsm = RegexFSM('a*4.+hi')
+        for _ in range(3):
+            for convert in (bytearray, memoryview):
+                with self.subTest(convert=convert):
+                    self.assertTrue(fsm.check_string(convert(b'aa4zhi')))
+                    self.assertFalse(fsm.check_string(convert(b'aa4hi')))
+            self.assertTrue(fsm.check_string(memoryview(b'xaa4zhix')[1:-1]))
+
+    def test_match_buffers(self):
+        # latin-1 strings give bytes buffers, wider ones arrays of code points
+        self.check_engine(lambda pattern, string: RegexFSM(pattern)._match(_to_buffer(string)))
+
+    def test_dfa(self):
+        def run(pattern, string):
+            fsm = RegexFSM(pattern)
+            self.assertTrue(fsm._build_dfa())
+            fsm._impl = fsm._dfa_check
+            return fsm.check_string(string)
+        self.check_engine(run)
+
+    @unittest.skipIf(regex._native_match is None, "_regex_core is not built")
+    def test_native_driver(self):
+        def run(pattern, string):
+            fsm = RegexFSM(pattern)
+            fsm._build_dfa()
+            data = latin1(string)
+            if data is None:
+                return expected(pattern, string)
+            start = len(fsm._affix_bytes[0])
+            if not data.startswith(fsm._affix_bytes[0]):
+                return False
+            return regex._native_match(fsm._flat_table, fsm.byte_classes, fsm._accept_flags, data,
+                                       fsm._prefix_state, start)
+        self.check_engine(run)
+
+    def test_jit_driver(self):
+        try:
+            fsms = {pattern: RegexFSM(pattern, jit=True) for pattern in PATTERNS}
+        except ImportError:
+            self.skipTest("numba is not installed")
+        for _ in range(3):
+            self.check_engine(lambda pattern, string: fsms[pattern].check_string(string))
+
+
+class BacktrackerTest(unittest.TestCase):
+    def test_start_after_prefix(self):
+        fsm = RegexFSM('ab*c')
+        self.assertTrue(fsm._match(b'zbbc', 1))
+        self.assertFalse(fsm._match(b'abbz', 1))
+        self.assertTrue(fsm._match(_to_buffer('їbbc'), 1))
+
+    def test_adjacent_quantifiers_stay_linear(self):
+        # every (pattern_pos, string_pos) pair is expanded once with O(1) successors,
+        # so these finish in milliseconds instead of growing with |string| ** 2
+        for pattern in ('a*a*a*a*a*', '[ab]*a*[ab]*c*'):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                fsm = RegexFSM(pattern)
+            for buf in (b'a' * 20000 + b'z', _to_buffer('a' * 20000 + 'ї')):
+                with self.subTest(pattern=pattern, buf=type(buf)):
+                    started = time.perf_counter()
+                    self.assertFalse(fsm._match(buf))
+                    self.assertLess(time.perf_counter() - started, 2)
+
+
+class LazyEngineTest(unittest.TestCase):
+    def test_dfa_is_built_on_second_match(self):
+        fsm = RegexFSM('a*b')
+        self.assertTrue(fsm.check_string('aab'))
+        self.assertIsNone(fsm.dfa_table)
+        self.assertTrue(fsm.check_string('b'))
+        self.assertIsNotNone(fsm.dfa_table)
+
+    def test_ambiguous_pattern_uses_dfa_first(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            fsm = RegexFSM('a*a*a*a*a*')
+        self.assertFalse(fsm.check_string('a' * 4000 + 'z'))
+        self.assertIsNotNone(fsm.dfa_table)
+        self.assertTrue(fsm.check_string('a' * 4000))
+        self.assertFalse(fsm.check_string('a' * 4000 + 'ї'))
+
+    def test_dfa_size_cap(self):
+        pattern = '.*a' + '.' * 12
+        fsm = RegexFSM(pattern)
+        self.assertFalse(fsm._build_dfa())
+        for string in ['a' * 13, 'b' * 13, 'xa' + 'b' * 12, 'a' + 'b' * 12 + 'a', 'ї' + 'a' * 13]:
+            for _ in range(3):
+                self.assertEqual(fsm.check_string(string), expected(pattern, string))
+        self.assertIsNone(fsm.dfa_table)
+        self.assertEqual(fsm._impl, fsm._lazy_dfa_check)
+
+    def test_lazy_dfa_cache_flush(self):
+        random_strings = random.Random(0)
+        with mock.patch.object(regex, 'MAX_DFA_STATES', 8):
+            for pattern in ('.*a...b', 'x[ab]*a..[bc]*', 'ab.*a..c*'):
+                fsm = RegexFSM(pattern)
+                fsm.check_string('')
+                self.assertIsNone(fsm.dfa_table)
+                for _ in range(200):
+                    string = pattern[:2] + ''.join(random_strings.choice('abcx') for _ in range(12))
+                    with self.subTest(pattern=pattern, string=string):
+                        self.assertEqual(fsm.check_string(string), expected(pattern, string))
+                self.assertLessEqual(len(fsm._lazy_subsets), 8)
+
+    def test_shared_instance_across_threads(self):
+        # a DFA big enough for the threads to overlap while it is being built
+        pattern = '.*a' + '.' * 7 + 'N'
+        string = 'a' * 8 + 'N'
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        for _ in range(10):
+            regex.compile.cache_clear()
+            barrier = threading.Barrier(8)
+            results = []
+
+            def work():
+                barrier.wait()
+                results.extend(regex.compile(pattern).check_string(string) for _ in range(20))
+
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, [True] * 160)
+
+
+class AmbiguityWarningTest(unittest.TestCase):
+    def test_warning_points_at_caller(self):
+        regex.compile.cache_clear()
+        for make in (RegexFSM, regex.compile):
+            with self.subTest(make=make), warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                make('a*a*b')
+                self.assertEqual(len(caught), 1)
+                self.assertEqual(caught[0].filename, __file__)
+
+
+if __name__ == '__main__':
+    unittest.main()